@@ -1,113 +1,348 @@
-
+import asyncio
+import hashlib
 import json
 import os
 import re
 from pathlib import Path
 from typing import Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from content_extractor import ContentExtractor, build_keyword_automaton
+except ImportError:
+    ContentExtractor = None
+    build_keyword_automaton = None
 
+_SENT_BOUNDARIES = '.!?\n'
+_SUGGESTION_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_NUMBERED_SECTION = re.compile(r'^\s*\**\s*(\d+)\s*[.):]', re.M)
+# A 'Planning:' label that follows the design text on the same line
+_INLINE_PLANNING = re.compile(r'(?<!^)(?:\*\*)?\bplanning(?:\s+suggestions?)?(?:\*\*)?\s*:', re.I | re.M)
 
 USE_HF = bool(os.getenv('HF_TOKEN'))
 USE_LLM = USE_HF
 
+# Keywords sent to the model per chat completion, and the token budget for each
+HF_BATCH_SIZE = int(os.getenv('HF_BATCH_SIZE', '16'))
+HF_TOKENS_PER_KEYWORD = 150
+# OpenAI-compatible chat completions endpoint and number of requests in flight
+HF_API_URL = os.getenv('HF_API_URL', 'https://router.huggingface.co/v1/chat/completions')
+HF_CONCURRENCY = 16
+# Suggestions already generated for a (model, keyword, sentence), reused across runs
+HF_CACHE_PATH = Path(os.getenv('HF_CACHE', '.hf_cache.json'))
 
+SYSTEM_PROMPT = (
+    "You are an expert urban designer and planner.\n\n"
+    "You will receive a numbered list of citizen feedback keywords, each with the exact "
+    "sentence where it was found. For every item provide two short suggestions: first a "
+    "design suggestion, then a planning suggestion. Each suggestion should be 1-2 short "
+    "sentences. Do NOT return JSON—return plain text only, repeating the item number and "
+    "using exactly this layout:\n"
+    "1.\n"
+    "Design: <design suggestion>\n"
+    "Planning: <planning suggestion>"
+)
 
 
 def load_json(p: Path):
     if not p.exists():
         return None
+    if orjson is not None:
+        return orjson.loads(p.read_bytes())
     return json.loads(p.read_text(encoding='utf-8'))
 
 
-def find_sentence_containing(text: str, keyword: str) -> Optional[str]:
-    if not text:
-        return None
-    # split to sentences roughly (keep newlines as boundaries)
-    sentences = re.split(r'(?<=[.!?\n])\s+', text)
+def write_json(p: Path, data):
+    if orjson is not None:
+        p.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        p.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def lower_text(text: str) -> str:
+    # str.lower() can change the length of a few characters (e.g. 'İ'); keep
+    # offsets into the lowered text valid for slicing the original
+    text_lower = text.lower()
+    if len(text_lower) != len(text):
+        text_lower = ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+    return text_lower
+
+
+def _sentence_start(text: str, pos: int) -> int:
+    # a sentence ends at [.!?\n] followed by whitespace
+    best = -1
+    for c in _SENT_BOUNDARIES:
+        i = text.rfind(c, 0, pos)
+        while i > best and not text[i + 1].isspace():
+            i = text.rfind(c, 0, i)
+        best = max(best, i)
+    return best + 1
+
+
+def _sentence_end(text: str, pos: int) -> int:
+    best = len(text)
+    for c in _SENT_BOUNDARIES:
+        i = text.find(c, pos)
+        while 0 <= i < best - 1 and not text[i + 1].isspace():
+            i = text.find(c, i + 1)
+        if 0 <= i < best:
+            best = i + 1
+    return best
+
+
+def sentence_around(text: str, start: int, end: int) -> str:
+    return text[_sentence_start(text, start):_sentence_end(text, end)].strip()
+
+
+def find_sentence_containing(text: str, text_lower: str, keyword: str) -> Optional[str]:
     k = keyword.lower()
-    # first try exact phrase
-    for s in sentences:
-        if k in s.lower():
-            return s.strip()
-    # fallback: split by commas and try parts
-    for s in sentences:
-        parts = s.split(',')
-        for p in parts:
-            if any(tok in p.lower() for tok in k.split() if len(tok) > 2):
-                return p.strip()
-    return None
-
-def llm_generate_prompts(keyword: str, citizen_sentence: str) -> dict:
+    idx = text_lower.find(k) if k else -1
+    if idx < 0:
+        return None
+    return sentence_around(text, idx, idx + len(k))
+
+
+def find_sentences_for_keywords(text: str, text_lower: str, keywords: list) -> dict:
+    """Map each lowercased keyword to the first sentence of `text` containing it."""
+    found = {}
+    if not text or not keywords:
+        return found
+    automaton = build_keyword_automaton(keywords) if build_keyword_automaton else None
+    if automaton is None:
+        for keyword in keywords:
+            sentence = find_sentence_containing(text, text_lower, keyword)
+            if sentence:
+                found[keyword.lower()] = sentence
+        return found
+
+    # one pass over the text matches every keyword simultaneously
+    wanted = len(automaton)
+    for end, k in automaton.iter(text_lower):
+        if k not in found:
+            found[k] = sentence_around(text, end - len(k) + 1, end + 1)
+            if len(found) == wanted:
+                break
+    return found
+
+
+def _chat_text(chat_resp) -> str:
+    # chat_resp may be dict-like with 'choices'
+    if not isinstance(chat_resp, dict):
+        return ''
+    choices = chat_resp.get('choices')
+    if not isinstance(choices, list) or not choices:
+        return ''
+    choice = choices[0]
+    # Hf sometimes nests under 'message' -> 'content'
+    if isinstance(choice, dict):
+        msg = choice.get('message') or {}
+        if isinstance(msg, dict):
+            return msg.get('content') or msg.get('text') or ''
+    return str(choice)
+
+
+def _split_suggestions(body: str) -> tuple:
+    design, planner = [], []
+    current = None
+    # Start a new line at an inline planning label so both labels are seen below
+    for line in _INLINE_PLANNING.sub(lambda m: '\n' + m.group(0), body).splitlines():
+        line = line.strip(' *-\t')
+        if not line:
+            continue
+        label, sep, rest = line.partition(':')
+        label = label.strip(' *').lower()
+        if sep and label.startswith('design'):
+            current = design
+            line = rest.strip(' *')
+        elif sep and label.startswith('plan'):
+            current = planner
+            line = rest.strip(' *')
+        if current is not None and line:
+            current.append(line)
+    if design or planner:
+        return ' '.join(design), ' '.join(planner)
+
+    # no labels: treat the first two sentences as design and planning suggestions
+    joined = ' '.join(l.strip() for l in body.splitlines() if l.strip())
+    sents = _SUGGESTION_SPLIT.split(joined)
+    design = sents[0].strip() if sents else ''
+    planner = sents[1].strip() if len(sents) > 1 else ''
+    return design, planner
+
+
+def _parse_numbered_reply(text: str, count: int) -> dict:
+    """Split a numbered batch reply into {item number: (design, planning)}.
+
+    Any numbered line may start a section, as long as the section numbers
+    increase and stay within `count`. Numbered suggestion lines and nested
+    lists look the same as headers, so of all such choices the one that
+    recovers the most non-empty design/planning fields wins; ties go to more
+    sections. Skipped item numbers are simply absent from the result.
+
+    >>> _parse_numbered_reply("1. Design: Benches\\nPlanning:\\n2. Add lighting at 3 points\\n"
+    ...                       "2. Design: Wider paths\\nPlanning: Budget", 2)
+    {1: ('Benches', '2. Add lighting at 3 points'), 2: ('Wider paths', 'Budget')}
+    >>> _parse_numbered_reply("1. Design: Benches. Planning: Funding.\\n"
+    ...                       "2. **Design:** Shade **Planning:** Trees", 2)
+    {1: ('Benches.', 'Funding.'), 2: ('Shade', 'Trees')}
+    >>> _parse_numbered_reply("1.\\nDesign: A1\\nPlanning: P1\\n3.\\nDesign: A3\\nPlanning: P3\\n"
+    ...                       "4.\\nDesign: A4\\nPlanning: P4", 4)
+    {1: ('A1', 'P1'), 3: ('A3', 'P3'), 4: ('A4', 'P4')}
+    >>> _parse_numbered_reply("1.\\nDesign: A1 with steps:\\n1. do x\\n2. do y\\nPlanning: P1\\n"
+    ...                       "2.\\nDesign: A2\\nPlanning: P2", 2)
+    {1: ('A1 with steps: 1. do x 2. do y', 'P1'), 2: ('A2', 'P2')}
+    """
+    matches = [m for m in _NUMBERED_SECTION.finditer(text) if 1 <= int(m.group(1)) <= count]
+    numbers = [int(m.group(1)) for m in matches]
+    total = len(matches)
+    if not total:
+        return {}
+
+    def section(i, j):
+        end = matches[j].start() if j < total else len(text)
+        return _split_suggestions(text[matches[i].end():end])
+
+    # best[i]: (filled fields, sections, next header) for a split whose first header is matches[i]
+    best = [None] * total
+    for i in range(total - 1, -1, -1):
+        fields = section(i, total)
+        choice = (sum(map(bool, fields)), 1, total)
+        for j in range(i + 1, total):
+            if numbers[j] <= numbers[i]:
+                continue
+            fields = section(i, j)
+            score, sections, _ = best[j]
+            candidate = (sum(map(bool, fields)) + score, sections + 1, j)
+            if candidate[:2] > choice[:2]:
+                choice = candidate
+        best[i] = choice
+
+    i = max(range(total), key=lambda k: best[k][:2])
+    sections = {}
+    while i < total:
+        nxt = best[i][2]
+        sections[numbers[i]] = section(i, nxt)
+        i = nxt
+    return sections
+
+
+def _batch_messages(batch: list) -> list:
+    lines = [
+        f"{i}. Keyword '{keyword}' from the sentence: \"{sentence}\""
+        for i, (keyword, sentence) in enumerate(batch, 1)
+    ]
+    return [
+        # Keep the shared instructions first so the server can reuse the cached prefix
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": "\n".join(lines)},
+    ]
+
+
+def _placeholder(tag: str, keyword: str) -> dict:
+    return {
+        'design_suggestion': f"[{tag}] design suggestion for '{keyword}'",
+        'planning_suggestion': f"[{tag}] planning suggestion for '{keyword}'"
+    }
+
+
+async def call_hf(session, semaphore: asyncio.Semaphore, batch: list) -> str:
+    payload = {
+        'model': os.getenv('HF_MODEL'),
+        'messages': _batch_messages(batch),
+        'max_tokens': HF_TOKENS_PER_KEYWORD * len(batch)
+    }
+    async with semaphore:
+        try:
+            async with session.post(HF_API_URL, json=payload) as resp:
+                body = await resp.text()
+                if resp.status != 200:
+                    print(f'HF request failed ({resp.status}):', body[:200])
+                    return ''
+        except Exception as e:
+            print('HF request failed:', e)
+            return ''
+
+    # Tolerate trailing garbage after the JSON document
+    try:
+        chat_resp, _ = json.JSONDecoder().raw_decode(body.strip())
+    except ValueError as e:
+        print('HF response was not valid JSON:', e)
+        return ''
+    return _chat_text(chat_resp)
+
+
+async def _generate_batches(batches: list) -> list:
+    import aiohttp
+    headers = {'Authorization': f"Bearer {os.getenv('HF_TOKEN')}"}
+    semaphore = asyncio.Semaphore(HF_CONCURRENCY)
+    async with aiohttp.ClientSession(headers=headers) as session:
+        return await asyncio.gather(*(call_hf(session, semaphore, batch) for batch in batches))
+
+
+def _cache_key(keyword: str, sentence: str) -> str:
+    key = f"{os.getenv('HF_MODEL') or ''}|{keyword}|{sentence}"
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def llm_generate_prompts_batch(pairs: list) -> list:
+    """Generate design/planning suggestions for (keyword, citizen_sentence) pairs.
+
+    Pairs are grouped by similar sentence length into batches of
+    HF_BATCH_SIZE, and up to HF_CONCURRENCY batches are requested
+    concurrently. Pairs answered in an earlier run are served from
+    HF_CACHE_PATH. Returns one dict per pair, in the order of `pairs`.
+    """
     if not USE_LLM:
-        return {
+        return [{
             'design_suggestion': '[LLM disabled] craft design suggestion here',
             'planning_suggestion': '[LLM disabled] craft planning suggestion here'
-     }
-
+        } for _ in pairs]
 
+    cache = load_json(HF_CACHE_PATH) or {}
+    cached_count = len(cache)
+    keys = [_cache_key(keyword, sentence) for keyword, sentence in pairs]
+    results = [cache.get(key) or _placeholder('HF unavailable', keyword) for key, (keyword, _) in zip(keys, pairs)]
+    todo = [i for i, key in enumerate(keys) if key not in cache]
+    if not todo:
+        return results
 
-    # Hugging Face Inference if HF_TOKEN is set
-    if USE_HF:
+    order = sorted(todo, key=lambda i: len(pairs[i][1]))
+    groups = [order[start:start + HF_BATCH_SIZE] for start in range(0, len(order), HF_BATCH_SIZE)]
+    batches = [[pairs[i] for i in indices] for indices in groups]
     try:
-        from huggingface_hub import InferenceClient
-        hf = InferenceClient(token=os.getenv('HF_TOKEN'))
-        model = os.getenv('HF_MODEL')
-        # Build prompts that include the exact sentence where the keyword was found
-        context = f"Based on this citizen feedback keyword '{keyword}' from the sentence: \"{original_sentence}\""
-        
-        # Ask for two short plain sentences: first a design suggestion, then a planning suggestion.
-        prompt = (
-            f"You are an expert urban designer and planner.\n\n"
-            f"{context}\n\n"
-            "Please provide two short suggestions as plain text: first a design suggestion, then a planning suggestion.\n"
-            "Each suggestion should be 1-2 short sentences. Do NOT return JSON—return plain text only, with the design suggestion first, then the planning suggestion on the next line."
-        )
-        
-        text = ''
-        try:
-            if hasattr(hf, 'chat'):
-                try:
-                    # Use the ProxyClientChat completions API (create method)
-                    chat_resp = hf.chat.completions.create(messages=[{"role": "user", "content": prompt}], model=model, max_tokens=200)
-                    # chat_resp may be dict-like with 'choices'
-                    if isinstance(chat_resp, dict):
-                        
-                        if 'choices' in chat_resp and isinstance(chat_resp['choices'], list) and chat_resp['choices']:
-                            choice = chat_resp['choices'][0]
-                            # Hf sometimes nests under 'message' -> 'content'
-                            if isinstance(choice, dict):
-                                msg = choice.get('message') or {}
-                                if isinstance(msg, dict):
-                                    text = msg.get('content') or msg.get('text') or ''
-                                else:
-                                    text = str(choice)
-                            else:
-                                text = str(choice)
-                except Exception as e:
-                    print('hf.chat.completions call failed:', e)
-                    text = ''
-
-        # If we have text, parse first two sentences as design and planning suggestions
-        if text:
-            lines = [l.strip() for l in re.split(r"[\n\r]+", text) if l.strip()]
-            joined = ' '.join(lines)
-            sents = re.split(r'(?<=[.!?])\s+', joined)
-            design = sents[0].strip() if sents else ''
-            planner = sents[1].strip() if len(sents) > 1 else ''
-            if not design:
-                design = f"[HF empty] design suggestion for '{keyword}'"
-            if not planner:
-                planner = f"[HF empty] planning suggestion for '{keyword}'"
-            return {'design_suggestion': design, 'planning_suggestion': planner}
-
-        # If no usable text returned, return placeholders
-        return {
-            'design_suggestion': f"[HF unavailable] design suggestion for '{keyword}'",
-            'planning_suggestion': f"[HF unavailable] planning suggestion for '{keyword}'"
-        }
+        texts = asyncio.run(_generate_batches(batches))
     except Exception as e:
         print(' HuggingFace inference failed:', e)
+        return results
 
+    for indices, text in zip(groups, texts):
+        if not text:
+            continue
+        sections = _parse_numbered_reply(text, len(indices))
+        # a reply that skips or merges items may have shifted text between
+        # them, so only a batch answered item by item is remembered
+        cacheable = len(sections) == len(indices)
+        for n, i in enumerate(indices, 1):
+            keyword = pairs[i][0]
+            design, planner = sections.get(n, ('', ''))
+            results[i] = {
+                'design_suggestion': design or f"[HF empty] design suggestion for '{keyword}'",
+                'planning_suggestion': planner or f"[HF empty] planning suggestion for '{keyword}'"
+            }
+            # only remember complete answers so gaps are retried next run
+            if cacheable and design and planner:
+                cache[keys[i]] = results[i]
+
+    if len(cache) > cached_count:
+        try:
+            write_json(HF_CACHE_PATH, cache)
+        except OSError as e:
+            print('Could not write HF cache:', e)
+    return results
 
 
 def main():
@@ -117,9 +352,12 @@ def main():
         return
 
     kb = load_json(kb_path)
+    # raw text saved by the KeyBERT run, keyed by filepath
+    texts = load_json(Path('keybert_keywords_texts.json')) or {}
     extractor = ContentExtractor() if ContentExtractor else None
 
     results = []
+    pairs = []
     files_processed = 0
 
     for fileEntry in kb.get('results', []):
@@ -131,22 +369,26 @@ def main():
         # Try recorded full filepath first
         if recorded_filepath:
             candidate = Path(recorded_filepath)
+            cached = texts.get(recorded_filepath)
             if candidate.exists():
                 try:
-                    if extractor:
+                    if cached and cached.get('mtime') == candidate.stat().st_mtime:
+                        text = cached.get('raw_text') or ''
+                    elif extractor:
                         text = extractor.extract_text(candidate)
                     else:
                         text = candidate.read_text(encoding='utf-8', errors='ignore')
                 except Exception:
                     text = ''
 
+        files_processed += 1
+        phrases = [(kw.get('keyword') or '').strip() for kw in fileEntry.get('keywords', [])]
+        phrases = [phrase for phrase in phrases if phrase]
+        sentences = find_sentences_for_keywords(text, lower_text(text), phrases)
 
         # Process keywords for this file
-        for kw in fileEntry.get('keywords', []):
-            phrase = (kw.get('keyword') or '').strip()
-            if not phrase:
-                continue
-            sentence = find_sentence_containing(text, phrase) or ''
+        for phrase in phrases:
+            sentence = sentences.get(phrase.lower(), '')
             # If no sentence found in extracted text, fall back to KeyBERT's example sentences
             if not sentence:
                 ex_sents = fileEntry.get('example_sentences') or []
@@ -154,10 +396,6 @@ def main():
                 if first:
                     sentence = first.strip()
 
-            suggestions = llm_generate_prompts(phrase, sentence)
-            # Ensure non-empty suggestions: replace empty strings with placeholders
-            design_sugg = suggestions.get('design_suggestion', '') or f"[HF empty] design suggestion for '{phrase}'"
-            plan_sugg = suggestions.get('planning_suggestion', '') or f"[HF empty] planning suggestion for '{phrase}'"
             entry = {
                 'day': '',
                 'keyword': phrase,
@@ -167,15 +405,25 @@ def main():
                         'original_sentence': sentence,
                         'exact_sentence': sentence
                     },
-                    'designer': {'design_suggestion': design_sugg},
-                    'planner': {'planning_suggestion': plan_sugg}
+                    'designer': {'design_suggestion': ''},
+                    'planner': {'planning_suggestion': ''}
                 },
                 'source': str(recorded_filepath or recorded_name or 'unknown')
             }
             results.append(entry)
+            pairs.append((phrase, sentence))
+
+    # Ask the LLM for all keywords at once so requests can be batched
+    for entry, suggestions in zip(results, llm_generate_prompts_batch(pairs)):
+        phrase = entry['keyword']
+        # Ensure non-empty suggestions: replace empty strings with placeholders
+        design_sugg = suggestions.get('design_suggestion', '') or f"[HF empty] design suggestion for '{phrase}'"
+        plan_sugg = suggestions.get('planning_suggestion', '') or f"[HF empty] planning suggestion for '{phrase}'"
+        entry['roles']['designer']['design_suggestion'] = design_sugg
+        entry['roles']['planner']['planning_suggestion'] = plan_sugg
 
     out = Path('structured_keywords.json')
-    out.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    write_json(out, results)
     print(f"Processed {files_processed} files and wrote {len(results)} keyword entries to {out}")
 
 if __name__ == '__main__':
@@ -4,68 +4,131 @@ Content Extractor Module for Bamboards
 Extracts text content from various file formats for wordcloud generation
 """
 
+import itertools
 import re
 from pathlib import Path
 from typing import List, Dict, Optional
 import json
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Precompiled patterns used by the text cleaning and keyword helpers
+_WS = re.compile(r'\s+')
+_SPECIAL = re.compile(r'[^\w\säöüÄÖÜß.,!?;:\-]')
+# Keyword candidates are runs of word characters; everything else separates them
+_WORD_RUN = re.compile(r'\w+')
+_LETTERS = 'abcdefghijklmnopqrstuvwxyzäöüßABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÜ'
+_SENT_END = re.compile(r'[.!?]+')
+
+
+def build_keyword_automaton(keywords: List[str]):
+    """Build an Aho-Corasick automaton over lowercased keywords.
+
+    Each match yields the lowercased keyword. Returns None when
+    pyahocorasick is not installed or there is nothing to match.
+    """
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        keyword_lower = keyword.lower()
+        if keyword_lower:
+            automaton.add_word(keyword_lower, keyword_lower)
+    if not len(automaton):
+        return None
+    automaton.make_automaton()
+    return automaton
+
+
+# German and English stopwords (basic set)
+_STOP_WORDS = frozenset({
+    # German stopwords
+    'der', 'die', 'das', 'und', 'oder', 'aber', 'auch', 'noch', 'nicht',
+    'ist', 'sind', 'war', 'waren', 'haben', 'hat', 'hatte', 'hatten',
+    'werden', 'wird', 'wurde', 'wurden', 'sein', 'seine', 'seiner',
+    'ich', 'du', 'er', 'sie', 'es', 'wir', 'ihr', 'sie', 'mich', 'dich',
+    'sich', 'uns', 'euch', 'ihm', 'ihr', 'ihnen', 'mir', 'dir',
+    'ein', 'eine', 'einer', 'eines', 'einem', 'einen',
+    'auf', 'aus', 'bei', 'mit', 'nach', 'von', 'zu', 'an', 'in', 'für',
+    'über', 'unter', 'durch', 'gegen', 'ohne', 'um', 'vor', 'zwischen',
+    'dass', 'wenn', 'weil', 'da', 'als', 'wie', 'wo', 'was', 'wer',
+    'welche', 'welcher', 'welches', 'dieser', 'diese', 'dieses',
+    'jeder', 'jede', 'jedes', 'alle', 'alles', 'viele', 'wenige',
+    'mehr', 'weniger', 'sehr', 'ganz', 'gar', 'nur', 'schon',
+    
+    # English stopwords
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'up', 'about', 'into', 'through', 'during',
+    'before', 'after', 'above', 'below', 'between', 'among', 'throughout',
+    'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had',
+    'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might',
+    'must', 'can', 'shall', 'ought', 'need', 'dare',
+    'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us',
+    'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'mine',
+    'yours', 'ours', 'theirs', 'myself', 'yourself', 'himself', 'herself',
+    'itself', 'ourselves', 'yourselves', 'themselves',
+    'this', 'that', 'these', 'those', 'what', 'which', 'who', 'whom',
+    'whose', 'where', 'when', 'why', 'how', 'all', 'any', 'both', 'each',
+    'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not',
+    'only', 'own', 'same', 'so', 'than', 'too', 'very', 'just', 'now'
+})
+
+# Additional domain-specific stopwords
+_DOMAIN_STOP = frozenset({
+    'bamboard', 'bamboards', 'display', 'screen', 'digital', 'public',
+    'system', 'user', 'users', 'interface', 'design', 'technology',
+    'page', 'document', 'file', 'pdf', 'docx', 'text', 'content'
+})
+
+_ALL_STOP = _STOP_WORDS | _DOMAIN_STOP
+
 
 class ContentExtractor:
     def __init__(self):
-        # German and English stopwords (basic set)
-        self.stop_words = {
-            # German stopwords
-            'der', 'die', 'das', 'und', 'oder', 'aber', 'auch', 'noch', 'nicht',
-            'ist', 'sind', 'war', 'waren', 'haben', 'hat', 'hatte', 'hatten',
-            'werden', 'wird', 'wurde', 'wurden', 'sein', 'seine', 'seiner',
-            'ich', 'du', 'er', 'sie', 'es', 'wir', 'ihr', 'sie', 'mich', 'dich',
-            'sich', 'uns', 'euch', 'ihm', 'ihr', 'ihnen', 'mir', 'dir',
-            'ein', 'eine', 'einer', 'eines', 'einem', 'einen',
-            'auf', 'aus', 'bei', 'mit', 'nach', 'von', 'zu', 'an', 'in', 'für',
-            'über', 'unter', 'durch', 'gegen', 'ohne', 'um', 'vor', 'zwischen',
-            'dass', 'wenn', 'weil', 'da', 'als', 'wie', 'wo', 'was', 'wer',
-            'welche', 'welcher', 'welches', 'dieser', 'diese', 'dieses',
-            'jeder', 'jede', 'jedes', 'alle', 'alles', 'viele', 'wenige',
-            'mehr', 'weniger', 'sehr', 'ganz', 'gar', 'nur', 'schon',
-            
-            # English stopwords
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'from', 'up', 'about', 'into', 'through', 'during',
-            'before', 'after', 'above', 'below', 'between', 'among', 'throughout',
-            'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had',
-            'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might',
-            'must', 'can', 'shall', 'ought', 'need', 'dare',
-            'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us',
-            'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'mine',
-            'yours', 'ours', 'theirs', 'myself', 'yourself', 'himself', 'herself',
-            'itself', 'ourselves', 'yourselves', 'themselves',
-            'this', 'that', 'these', 'those', 'what', 'which', 'who', 'whom',
-            'whose', 'where', 'when', 'why', 'how', 'all', 'any', 'both', 'each',
-            'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not',
-            'only', 'own', 'same', 'so', 'than', 'too', 'very', 'just', 'now'
-        }
-        
-        # Additional domain-specific stopwords
-        self.domain_stopwords = {
-            'bamboard', 'bamboards', 'display', 'screen', 'digital', 'public',
-            'system', 'user', 'users', 'interface', 'design', 'technology',
-            'page', 'document', 'file', 'pdf', 'docx', 'text', 'content'
-        }
-        
-        self.all_stopwords = self.stop_words.union(self.domain_stopwords)
+        # Shared, immutable stopword sets built once at import
+        self.stop_words = _STOP_WORDS
+        self.domain_stopwords = _DOMAIN_STOP
+        self.all_stopwords = _ALL_STOP
     
     def extract_from_pdf(self, filepath: Path) -> str:
-        """Extract text from PDF file"""
+        """Extract text from PDF file (PDFium via pypdfium2, PyPDF2 as fallback)"""
+        try:
+            import pypdfium2 as pdfium
+        except ImportError:
+            return self.extract_from_pdf_pypdf2(filepath)
+        
+        try:
+            pdf = pdfium.PdfDocument(str(filepath))
+            try:
+                # PDFium separates lines with CRLF; PyPDF2 (and the rest of the pipeline) uses LF
+                return "".join(page.get_textpage().get_text_range().replace("\r\n", "\n") + "\n" for page in pdf)
+            finally:
+                pdf.close()
+        except Exception as e:
+            print(f" Error extracting from PDF {filepath.name}: {e}")
+            return ""
+    
+    def extract_from_pdf_pypdf2(self, filepath: Path) -> str:
+        """Extract text from PDF file with pure-Python PyPDF2"""
         try:
             import PyPDF2
             with open(filepath, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
-                text = ""
+                parts = []
                 for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+                    parts.append(page.extract_text())
+                    parts.append("\n")
+                return "".join(parts)
         except ImportError:
-            print("  PyPDF2 not installed. Install with: pip install PyPDF2")
+            print("  pypdfium2/PyPDF2 not installed. Install with: pip install pypdfium2")
             return ""
         except Exception as e:
             print(f" Error extracting from PDF {filepath.name}: {e}")
@@ -76,18 +139,16 @@ class ContentExtractor:
         try:
             import docx
             doc = docx.Document(filepath)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+            paragraphs = (paragraph.text + "\n" for paragraph in doc.paragraphs)
             
-            # Also extract text from tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        text += cell.text + " "
-                    text += "\n"
+            # Also extract text from tables, one line per row
+            rows = (
+                "".join(cell.text + " " for cell in row.cells) + "\n"
+                for table in doc.tables
+                for row in table.rows
+            )
             
-            return text
+            return "".join(itertools.chain(paragraphs, rows))
         except ImportError:
             print("  python-docx not installed. Install with: pip install python-docx")
             return ""
@@ -154,39 +215,32 @@ class ContentExtractor:
         if not text:
             return ""
         
-        # Remove extra whitespace and newlines
-        text = re.sub(r'\s+', ' ', text)
-        
         # Remove special characters but keep German umlauts and basic punctuation
-        text = re.sub(r'[^\w\säöüÄÖÜß.,!?;:\-]', ' ', text)
+        text = _SPECIAL.sub(' ', text)
         
-        # Remove multiple spaces
-        text = re.sub(r'\s+', ' ', text)
+        # Collapse whitespace, newlines and the spaces left by the removed characters
+        text = _WS.sub(' ', text)
         
         # Convert to lowercase for processing
-        text = text.lower()
-        
-        return text.strip()
+        return text.strip().lower()
     
     def extract_keywords(self, text: str, min_length: int = 3, max_length: int = 20) -> List[str]:
         """Extract meaningful keywords from text"""
-        cleaned_text = self.clean_text(text)
-        
-        if not cleaned_text:
+        if not text:
             return []
         
-        # Split into words
-        words = re.findall(r'\b[a-zA-ZäöüÄÖÜß]+\b', cleaned_text)
+        # Split into words in a single scan; this yields the same words as
+        # splitting clean_text() output, without building the cleaned copy
+        words = _WORD_RUN.findall(text.lower())
         
         # Filter words
         keywords = []
         for word in words:
-            word_lower = word.lower()
             if (min_length <= len(word) <= max_length and 
-                word_lower not in self.all_stopwords and 
-                not word.isdigit() and
-                not re.match(r'^[a-z]{1,2}$', word_lower)):  # Skip very short words
-                keywords.append(word_lower)
+                not word.strip(_LETTERS) and  # Letters only, no digits or underscores
+                word not in self.all_stopwords and 
+                not (len(word) <= 2 and word.isascii())):  # Skip very short words
+                keywords.append(word)
         
         return keywords
     
@@ -196,14 +250,22 @@ class ContentExtractor:
             return []
         
         # Split into sentences
-        sentences = re.split(r'[.!?]+', text)
+        sentences = _SENT_END.split(text)
+        
+        # Match all keywords in one pass per sentence when pyahocorasick is available
+        automaton = build_keyword_automaton(keywords)
+        keywords_lower = [keyword.lower() for keyword in keywords]
         
         relevant_sentences = []
         for sentence in sentences:
             sentence = sentence.strip()
             if len(sentence) > 20:  # Skip very short sentences
                 sentence_lower = sentence.lower()
-                if any(keyword in sentence_lower for keyword in keywords):
+                if automaton is not None:
+                    found = next(automaton.iter(sentence_lower), None) is not None
+                else:
+                    found = any(keyword in sentence_lower for keyword in keywords_lower)
+                if found:
                     relevant_sentences.append(sentence)
         
         return relevant_sentences
@@ -308,8 +370,11 @@ class ContentExtractor:
             ]
         }
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(json_results, f, indent=2, ensure_ascii=False)
+        if orjson is not None:
+            output_path.write_bytes(orjson.dumps(json_results, option=orjson.OPT_INDENT_2))
+        else:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(json_results, f, indent=2, ensure_ascii=False)
         
         print(f"💾 Saved extraction summary to: {output_path}")
     
@@ -336,13 +401,16 @@ def main():
     filter_tool = FileFilter(SHARE_URL)
     
     # Check if we have existing extracted files
-    zip_file = Path("downloads/bamboards_files.zip")
+    zip_file = filter_tool.archive_path()
     if zip_file.exists():
         print(" Using existing downloaded files...")
         categorized = filter_tool.extract_and_filter_zip(zip_file)
     else:
-        print(" No downloaded files found. Run file_filter.py first.")
-        return
+        # Downloads, filters and keeps the archive for later runs
+        print(" No downloaded archive found, downloading...")
+        categorized = filter_tool.download_and_filter()
+        if not categorized:
+            return
     
  
     extractor = ContentExtractor()
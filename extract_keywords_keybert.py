@@ -6,71 +6,144 @@ Scans files under `extracted/`, extracts text with `ContentExtractor`,
 uses KeyBERT (with sentence-transformers embeddings) to extract keywords
 and saves results to `keybert_keywords.json`.
 """
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import json
+import os
+import re
 from typing import List, Dict
 
 from content_extractor import ContentExtractor
 
-def extract_keywords_for_text(text: str, top_n: int = 15) -> List[Dict]:
-    try:
-        from keybert import KeyBERT
-        from sentence_transformers import SentenceTransformer
-    except Exception as e:
-        print("  KeyBERT or sentence-transformers not installed or failed to import:", e)
-        return []
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_KW_MODEL = None
 
-    if not text:
-        return []
+# Documents embedded per KeyBERT call while extraction continues in the background
+KEYBERT_BATCH_SIZE = 16
 
-    # Use a compact embedding model that's common and fast
-    
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-   
+# 'auto' runs the embedding model in fp16 on CUDA and int8 on CPU; 'fp32' keeps full precision
+KEYBERT_PRECISION = os.getenv('KEYBERT_PRECISION', 'auto').lower()
+
+
+def _reduce_precision(model):
+    """Halve the embedding model on GPU, or quantize its Linear layers to int8 on CPU"""
+    if KEYBERT_PRECISION == 'fp32':
+        return model
+    try:
+        import torch
+        if model.device.type == 'cuda':
+            return model.half()
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    except Exception as e:
+        print("  Could not reduce embedding precision, using fp32:", e)
+        return model
+
+
+def _get_model():
+    """Load the KeyBERT model once and reuse it for every file"""
+    global _KW_MODEL
+    if _KW_MODEL is None:
+        try:
+            from keybert import KeyBERT
+            from sentence_transformers import SentenceTransformer
+        except Exception as e:
+            print("  KeyBERT or sentence-transformers not installed or failed to import:", e)
+            _KW_MODEL = False
+            return None
+
+        # Use a compact embedding model that's common and fast
+        model = _reduce_precision(SentenceTransformer('all-MiniLM-L6-v2'))
+        _KW_MODEL = KeyBERT(model=model)
+    return _KW_MODEL or None
+
+
+def extract_keywords_for_texts(texts: List[str], top_n: int = 15) -> List[List[Dict]]:
+    """Extract keywords for many documents with one batched KeyBERT call.
+
+    KeyBERT embeds every document and every candidate phrase in a single
+    encode() pass when given a list, instead of one small pass per file.
+    """
+    results = [[] for _ in texts]
+    kw_model = _get_model()
+    if kw_model is None:
+        return results
+
+    indices = [i for i, text in enumerate(texts) if text]
+    if not indices:
+        return results
 
     try:
-        kw_model = KeyBERT(model=model)
         keywords = kw_model.extract_keywords(
-            text,
+            [texts[i] for i in indices],
             keyphrase_ngram_range=(1, 2),
             stop_words=None,
             use_mmr=True,
             diversity=0.6,
             top_n=top_n
         )
-        # keywords is list of (phrase, score)
-        return [{'keyword': k, 'score': float(s)} for k, s in keywords]
+        # a single document comes back as a flat list of (phrase, score)
+        if len(indices) == 1:
+            keywords = [keywords]
+        for i, doc_keywords in zip(indices, keywords):
+            results[i] = [{'keyword': k, 'score': float(s)} for k, s in doc_keywords]
     except Exception as e:
         print("KeyBERT extraction failed:", e)
-        return []
+    return results
+
+
+def extract_keywords_for_text(text: str, top_n: int = 15) -> List[Dict]:
+    return extract_keywords_for_texts([text], top_n=top_n)[0]
+
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.txt', '.rtf'}
+
+
+def _iter_supported_files(root):
+    # os.scandir reuses the directory entry's type info, so non-matching
+    # paths are skipped without a stat call or a Path object
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _iter_supported_files(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS and entry.is_file():
+                    yield Path(entry.path)
+    except PermissionError:
+        return
+
+
+# define heuristics to detect research papers/journals to skip
+RESEARCH_KEYWORDS = {
+    'paper', 'papers', 'proceedings', 'conference', 'journal', 'journal-',
+    'etal', 'doi', 'study', 'studies', 'research', 'maas_', 'chi', 'proceeding',
+    'citizenneeds', 'foundations', 'display_value', 'paper_chi'
+}
+_RESEARCH_RX = re.compile('|'.join(re.escape(kw) for kw in sorted(RESEARCH_KEYWORDS)))
+
+
+def _extract_one(fp: Path):
+    # Runs in a worker process: PDF/DOCX parsing is pure Python and CPU-bound
+    extractor = ContentExtractor()
+    text = extractor.extract_text(fp)
+    return fp, text, extractor.clean_text(text)
 
 
 def process_extracted_folder(root: Path, output_file: Path):
     extractor = ContentExtractor()
     results = []
 
-    files = list(root.rglob('*'))
-    # filter to files with supported extensions
-    supported = {'.pdf', '.docx', '.doc', '.txt', '.rtf'}
-    files = [f for f in files if f.is_file() and f.suffix.lower() in supported]
-
-    # define heuristics to detect research papers/journals to skip
-    research_keywords = {
-        'paper', 'papers', 'proceedings', 'conference', 'journal', 'journal-',
-        'etal', 'doi', 'study', 'studies', 'research', 'maas_', 'chi', 'proceeding',
-        'citizenneeds', 'foundations', 'display_value', 'paper_chi'
-    }
+    files = list(_iter_supported_files(root))
 
     def is_research_paper(p: Path) -> bool:
         # Only flag PDFs that are likely research papers (by filename)
         if p.suffix.lower() != '.pdf':
             return False
-        name = p.name.lower()
-        full = str(p).lower()
-        for kw in research_keywords:
-            if kw in name or kw in full:
-                return True
-        return False
+        # the filename is part of the full path, so one search covers both
+        return _RESEARCH_RX.search(str(p).lower()) is not None
 
     # exclude research papers/journals
     pre_count = len(files)
@@ -81,18 +154,32 @@ def process_extracted_folder(root: Path, output_file: Path):
 
     print(f" Found {len(files)} supported files under: {root}")
 
-    for fp in files:
-        # Show a stable filepath string — avoid Path.relative_to which can raise if
-        # one path is relative and the other absolute in some environments
-        print(f"\n📄 Processing: {fp}")
-        text = extractor.extract_text(fp)
-        if not text:
-            print("   ⚠️  No text extracted, skipping")
-            continue
-
-        cleaned = extractor.clean_text(text)
-        keywords = extract_keywords_for_text(cleaned, top_n=20)
-
+    # Workers keep parsing files while the parent embeds the batches that are
+    # already complete, so extraction and KeyBERT inference overlap
+    documents = []
+    all_keywords = []
+    pending = []
+    workers = max(1, min(os.cpu_count() or 1, len(files)))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for fp, text, cleaned in ex.map(_extract_one, files):
+            # Show a stable filepath string — avoid Path.relative_to which can raise if
+            # one path is relative and the other absolute in some environments
+            print(f"\n📄 Processing: {fp}")
+            if not text:
+                print("   ⚠️  No text extracted, skipping")
+                continue
+            documents.append((fp, text, cleaned))
+            pending.append(cleaned)
+            if len(pending) == KEYBERT_BATCH_SIZE:
+                print(f"\n🔑 Extracting keywords from {len(pending)} files")
+                all_keywords.extend(extract_keywords_for_texts(pending, top_n=20))
+                pending = []
+
+    if pending:
+        print(f"\n🔑 Extracting keywords from {len(pending)} files")
+        all_keywords.extend(extract_keywords_for_texts(pending, top_n=20))
+
+    for (fp, text, _), keywords in zip(documents, all_keywords):
         # also capture a few example sentences containing top keywords
         top_terms = [k['keyword'] for k in keywords[:8]]
         sentences = extractor.extract_sentences_with_keywords(text, top_terms)
@@ -105,11 +192,29 @@ def process_extracted_folder(root: Path, output_file: Path):
         })
 
     # save
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump({'summary': {'files_processed': len(results)}, 'results': results}, f, indent=2, ensure_ascii=False)
+    output = {'summary': {'files_processed': len(results)}, 'results': results}
+    if orjson is not None:
+        output_file.write_bytes(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+    else:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
 
     print(f"\n💾 Saved KeyBERT keywords to: {output_file}")
 
+    # keep the raw text so later steps don't have to parse the files again
+    texts = {
+        str(fp): {'mtime': fp.stat().st_mtime, 'raw_text': text}
+        for fp, text, _ in documents
+    }
+    texts_file = output_file.with_name(output_file.stem + '_texts.json')
+    if orjson is not None:
+        texts_file.write_bytes(orjson.dumps(texts))
+    else:
+        with open(texts_file, 'w', encoding='utf-8') as f:
+            json.dump(texts, f, ensure_ascii=False)
+
+    print(f"💾 Saved extracted text to: {texts_file}")
+
 
 def main():
     extracted_dir = Path('extracted')
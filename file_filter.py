@@ -2,15 +2,34 @@
 
 
 import requests
+import os
 import re
+import shutil
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urljoin
 from typing import List, Dict, Set
 from bs4 import BeautifulSoup
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Per-file progress lines are written to stdout in batches of this many
+PROGRESS_BATCH = 100
+
+# Separators used to split a filename into whole-word tokens
+_TOKEN_SPLIT = re.compile(r'[\s_\-.()]+')
+
 
 class FileFilter:
+    # Keyword groups reported by classify() as bit flags
+    TARGET = 1 << 0
+    RESEARCH = 1 << 1
+    EXCLUDE = 1 << 2
+
     def __init__(self, share_url: str):
         self.share_url = share_url
         
@@ -41,6 +60,51 @@ class FileFilter:
             'license', 'changelog', 'version', 'backup',
             'doku', 'fahrplan', 'katalog', 'widget'
         ]
+        
+        self._keyword_groups = tuple(
+            self._keyword_group(flag, keywords) for flag, keywords in (
+                (self.TARGET, self.target_content_keywords),
+                (self.RESEARCH, self.research_paper_keywords),
+                (self.EXCLUDE, self.exclude_keywords),
+            )
+        )
+        self._automaton = self._build_automaton()
+    
+    def _keyword_group(self, flag: int, keywords: List[str]):
+        # (flag, keywords shortest first, keyword set, shortest keyword length) for classify()
+        ordered = tuple(sorted(keywords, key=len))
+        return flag, ordered, frozenset(ordered), len(ordered[0])
+    
+    def _build_automaton(self):
+        # One Aho-Corasick automaton over all keyword groups; each keyword maps to its group flags
+        if ahocorasick is None:
+            return None
+        automaton = ahocorasick.Automaton()
+        for flag, keywords, _, _ in self._keyword_groups:
+            for keyword in keywords:
+                automaton.add_word(keyword, automaton.get(keyword, 0) | flag)
+        automaton.make_automaton()
+        return automaton
+    
+    def classify(self, filename_lower: str) -> int:
+        
+        flags = 0
+        if self._automaton is not None:
+            # Single pass over the filename matches every keyword group at once
+            for _, keyword_flags in self._automaton.iter(filename_lower):
+                flags |= keyword_flags
+            return flags
+        
+        # Whole-token hits are set lookups; the substring scan only runs when none match
+        tokens = _TOKEN_SPLIT.split(filename_lower)
+        size = len(filename_lower)
+        for flag, keywords, keyword_set, min_length in self._keyword_groups:
+            # No keyword of the group fits in a shorter name
+            if size < min_length:
+                continue
+            if not keyword_set.isdisjoint(tokens) or any(keyword in filename_lower for keyword in keywords):
+                flags |= flag
+        return flags
     
     def is_relevant_extension(self, filename: str) -> bool:
         
@@ -48,71 +112,105 @@ class FileFilter:
     
     def is_usability_test_file(self, filename: str) -> bool:
         
-        filename_lower = filename.lower()
-        
-        # Check for target content keywords 
-        has_target_keywords = any(
-            keyword in filename_lower for keyword in self.target_content_keywords
-        )
-        
-        # Check for research paper keywords
-        has_research_keywords = any(
-            keyword in filename_lower for keyword in self.research_paper_keywords
-        )
-        
-        # Check for other exclusion keywords
-        has_exclude_keywords = any(
-            keyword in filename_lower for keyword in self.exclude_keywords
-        )
+        flags = self.classify(filename.lower())
         
-        return has_target_keywords and not has_research_keywords and not has_exclude_keywords
+        # Target content keywords, but no research paper or exclusion keywords
+        return bool(flags & self.TARGET) and not flags & (self.RESEARCH | self.EXCLUDE)
     
     def get_bulk_download_url(self) -> str:
         
         return f"{self.share_url}/download"
     
-    def download_all_files(self, download_dir: str = "downloads") -> Path:
+    def archive_path(self, download_dir: str = "downloads") -> Path:
         
-        download_path = Path(download_dir)
-        download_path.mkdir(exist_ok=True)
-        
-        zip_file = download_path / "bamboards_files.zip"
-        
-        if zip_file.exists():
-            print(f" Archive already exists: {zip_file}")
-            return zip_file
+        return Path(download_dir) / "bamboards_files.zip"
+    
+    def download_and_filter(self, extract_dir: str = "extracted",
+                            download_dir: str = "downloads") -> Dict[str, List[Dict]]:
         
         print(" Downloading all files as zip archive...")
         
+        download_path = Path(download_dir)
+        download_path.mkdir(exist_ok=True)
+        zip_file = self.archive_path(download_dir)
+        partial_file = zip_file.with_name(zip_file.name + ".part")
+        
         try:
             download_url = self.get_bulk_download_url()
-            response = requests.get(download_url, stream=True)
-            response.raise_for_status()
-            
-            with open(zip_file, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            # The archive is written to disk and filtered from the same handle, then
+            # kept for content_extractor.py
+            with requests.get(download_url, stream=True) as response, open(partial_file, 'w+b') as buffer:
+                response.raise_for_status()
+                
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    buffer.write(chunk)
+                
+                print(f" Downloaded: {partial_file} ({buffer.tell() / 1024 / 1024:.1f} MB)")
+                buffer.seek(0)
+                categorized = self.extract_and_filter_zip_from_stream(buffer, extract_dir, raise_errors=True)
             
-            print(f" Downloaded: {zip_file} ({zip_file.stat().st_size / 1024 / 1024:.1f} MB)")
-            return zip_file
+            # Only an archive that opened and filtered cleanly is kept under the archive name
+            os.replace(partial_file, zip_file)
+            print(f" Saved archive: {zip_file}")
+            return categorized
             
         except Exception as e:
             print(f" Error downloading files: {e}")
+            if partial_file.exists():
+                partial_file.unlink()
             return None
     
     def is_excluded_file(self, filename: str) -> bool:
         
-        filename_lower = filename.lower()
-        
         # Check for exclusion keywords
-        return any(keyword in filename_lower for keyword in self.exclude_keywords)
+        return bool(self.classify(filename.lower()) & self.EXCLUDE)
+    
+    def member_path(self, extract_path: Path, member: str) -> Path:
+        
+        # Same sanitising as ZipFile.extract: no drive, absolute or '..' components
+        arcname = member.replace('/', os.sep)
+        if os.altsep:
+            arcname = arcname.replace(os.altsep, os.sep)
+        arcname = os.path.splitdrive(arcname)[1]
+        arcname = os.sep.join(part for part in arcname.split(os.sep) if part not in ('', os.curdir, os.pardir))
+        if os.sep == '\\':
+            # Windows: replace characters like ':' and '?' and strip trailing dots per part
+            arcname = zipfile.ZipFile._sanitize_windows_name(arcname, os.sep)
+        return extract_path.joinpath(*[part for part in arcname.split(os.sep) if part])
+    
+    def extract_member(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, extract_path: Path,
+                       created_dirs: Set[Path] = None) -> Path:
+        
+        target = self.member_path(extract_path, info.filename)
+        
+        # Directories already created for earlier members need no mkdir call
+        if created_dirs is None or target.parent not in created_dirs:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if created_dirs is not None:
+                created_dirs.add(target.parent)
+        
+        # Stream the member straight to disk in 1 MiB chunks
+        with zip_ref.open(info) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        return target
     
     def extract_and_filter_zip(self, zip_file: Path, extract_dir: str = "extracted") -> Dict[str, List[Dict]]:
        
+        print(f" Extracting files from {zip_file}...")
+        return self._filter_zip(zip_file, extract_dir)
+    
+    def extract_and_filter_zip_from_stream(self, stream, extract_dir: str = "extracted",
+                                           raise_errors: bool = False) -> Dict[str, List[Dict]]:
+        
+        # stream is any seekable binary file object holding the archive
+        print(" Extracting files from downloaded archive...")
+        return self._filter_zip(stream, extract_dir, raise_errors)
+    
+    def _filter_zip(self, source, extract_dir: str, raise_errors: bool = False) -> Dict[str, List[Dict]]:
+        
         extract_path = Path(extract_dir)
         extract_path.mkdir(exist_ok=True)
         
-        print(f" Extracting files from {zip_file}...")
         print(" Filtering for interview content only (excluding research papers & UX docs)")
         
         categorized = {
@@ -122,56 +220,97 @@ class FileFilter:
         }
         
         try:
-            with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                file_list = zip_ref.namelist()
+            with zipfile.ZipFile(source, 'r') as zip_ref, ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                # Central directory entries: names and sizes without touching member data
+                infos = zip_ref.infolist()
                 
-                print(f" Found {len(file_list)} files in archive")
+                print(f" Found {len(infos)} files in archive")
                 
-                for file_path in file_list:
-                    filename = Path(file_path).name
+                # Progress lines in archive order; extractions are (info, filename, target)
+                log = []
+                # Last member for each target path: a repeated name extracts its last
+                # entry once, as ZipFile.getinfo/extract would, instead of two racing writers
+                latest = {}
+                created_dirs = {extract_path}
+                
+                for info in infos:
+                    # Skip directory entries before any filename handling
+                    if info.is_dir():
+                        continue
+                    
+                    # Archive names always use '/', so a plain split gives the base name
+                    filename = info.filename.rsplit('/', 1)[-1]
                     
-                    # Skip directories and hidden files
+                    # Skip hidden files
                     if not filename or filename.startswith('.'):
                         continue
                     
                     if self.is_relevant_extension(filename):
+                        flags = self.classify(filename.lower())
                         
-                        if self.is_excluded_file(filename):
+                        if flags & self.EXCLUDE:
                             categorized['excluded_files'].append({
                                 'name': filename,
                                 'reason': 'Research paper/UX documentation'
                             })
-                            print(f" Skipping: {filename} ")
+                            log.append(f" Skipping: {filename} ")
                             continue
                         
                         # Only extract usability test files
-                        if self.is_usability_test_file(filename):
-                            try:
-                                zip_ref.extract(file_path, extract_path)
-                                extracted_file = extract_path / file_path
-                                
-                                file_info = {
-                                    'name': filename,
-                                    'path': extracted_file,
-                                    'original_path': file_path,
-                                    'is_interview_related': True,
-                                    'size': extracted_file.stat().st_size if extracted_file.exists() else 0
-                                }
-                                
-                                categorized['interview_files'].append(file_info)
-                                categorized['all_relevant_files'].append(file_info)
-                                print(f" Extracted: {filename}")
-                                
-                            except Exception as e:
-                                print(f"  Error extracting {file_path}: {e}")
+                        if flags & self.TARGET and not flags & self.RESEARCH:
+                            target = self.member_path(extract_path, info.filename)
+                            latest[target] = info
+                            log.append((info, filename, target))
                         else:
-                            print(f"  Skipping: {filename} (not interview-related)")
+                            log.append(f"  Skipping: {filename} (not interview-related)")
+                
+                # Inflate releases the GIL, so members decompress in parallel on the shared handle
+                futures = {
+                    target: executor.submit(self.extract_member, zip_ref, member, extract_path, created_dirs)
+                    for target, member in latest.items()
+                }
+                
+                # One write per PROGRESS_BATCH lines instead of one per file
+                lines = []
+                for entry in log:
+                    if len(lines) >= PROGRESS_BATCH:
+                        print("\n".join(lines))
+                        lines.clear()
+                    
+                    if isinstance(entry, str):
+                        lines.append(entry)
+                        continue
+                    
+                    info, filename, target = entry
+                    try:
+                        extracted_file = futures[target].result()
+                        
+                        file_info = {
+                            'name': filename,
+                            'path': extracted_file,
+                            'original_path': info.filename,
+                            'is_interview_related': True,
+                            'size': latest[target].file_size
+                        }
+                        
+                        categorized['interview_files'].append(file_info)
+                        categorized['all_relevant_files'].append(file_info)
+                        lines.append(f" Extracted: {filename}")
+                        
+                    except Exception as e:
+                        lines.append(f"  Error extracting {info.filename}: {e}")
+                
+                if lines:
+                    print("\n".join(lines))
                 
                 print(f"Extracted {len(categorized['interview_files'])} interview files")
                 print(f" Excluded {len(categorized['excluded_files'])} research/UX files")
                 
         except Exception as e:
             print(f" Error processing zip file: {e}")
+            # A caller that is about to keep the archive needs to know it is unreadable
+            if raise_errors:
+                raise
         
         return categorized
     
@@ -221,13 +360,18 @@ def main():
     print("Downloading all files as a zip and filtering locally...")
     
     
-    zip_file = filter_tool.download_all_files()
+    zip_file = filter_tool.archive_path()
     
-    if zip_file:
-        print(f"\n Success! Downloaded all files to: {zip_file}")
-        
-        
+    if zip_file.exists():
+        # Reuse an archive downloaded earlier
+        print(f" Archive already exists: {zip_file}")
         categorized = filter_tool.extract_and_filter_zip(zip_file)
+    else:
+        # Filter while downloading; the archive is kept for content extraction
+        categorized = filter_tool.download_and_filter()
+    
+    if categorized:
+        print("\n Success! Downloaded and filtered all files")
         
        
         filter_tool.print_file_summary(categorized)
@@ -1,10 +1,40 @@
+import functools
 import json
+import os
+from multiprocessing import Pool
 from pathlib import Path
 import re
 
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 IN = Path("structured_keywords.json")
 OUT = Path("structured_keywords_phased.json")
 
+# distinct records whose scores are remembered for duplicate inputs
+SCORE_CACHE_SIZE = 50_000
+
+# inputs with at least this many records are scored on a process pool
+POOL_MIN_RECORDS = 20000
+POOL_CHUNKSIZE = 256
+
 PHASES = ["Discover", "Define", "Develop", "Deliver"]
 
 discover_kw = [
@@ -26,78 +56,225 @@ deliver_kw = [
     "plan","planung","ticketing"
 ]
 
-# compile regexes for whole-word matching
-def compile_patterns(words):
-    return [re.compile(r"\b" + re.escape(w) + r"\b", re.I) for w in words]
+PHASE_KEYWORDS = [discover_kw, define_kw, develop_kw, deliver_kw]
+
+# compile one whole-word alternation per phase, so each phase is a single scan;
+# every keyword is its own group, so m.lastindex tells which keyword matched.
+# No re.I: texts are folded to lowercase once by fold_text before scanning
+def compile_pattern(words):
+    return re.compile(r"\b(?:" + "|".join("(" + re.escape(w) + ")" for w in words) + r")\b")
+
+discover_pat = compile_pattern(discover_kw)
+define_pat = compile_pattern(define_kw)
+develop_pat = compile_pattern(develop_kw)
+deliver_pat = compile_pattern(deliver_kw)
+phase_patterns = [discover_pat, define_pat, develop_pat, deliver_pat]
+
+# case-insensitive matching treats these as 'i'/'s'; fold them before lowercasing
+_FOLD = str.maketrans({'İ': 'i', 'ı': 'i', 'ſ': 's'})
+
+def fold_text(text):
+    """Lowercased text as every matcher expects it; empty for missing values"""
+    return str(text).translate(_FOLD).lower() if text else ""
+
+# one Aho-Corasick automaton over every phase's keywords: keyword -> (length, [(phase, index)])
+def build_automaton():
+    if ahocorasick is None:
+        return None
+    A = ahocorasick.Automaton()
+    for pid, words in enumerate(PHASE_KEYWORDS):
+        for kid, w in enumerate(words):
+            _, entries = A.get(w, (len(w), []))
+            entries.append((pid, kid))
+            A.add_word(w, (len(w), entries))
+    A.make_automaton()
+    return A
+
+automaton = build_automaton()
+
+# one Hyperscan block-mode database over every keyword as a whole-word pattern;
+# returns (database, [[(phase, index)] per pattern id]). Scans the folded, lowercased
+# text, so no caseless flag. \b is not allowed with UCP, so the boundaries are spelled
+# out as Unicode \W or the ends of the text; Hyperscan reports overlapping matches,
+# so consuming the neighbouring character does not hide an adjacent keyword
+def build_hyperscan_db():
+    if hyperscan is None:
+        return None, None
+    positions = {}
+    for pid, words in enumerate(PHASE_KEYWORDS):
+        for kid, w in enumerate(words):
+            positions.setdefault(w, []).append((pid, kid))
+    words = list(positions)
+    flags = hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH
+    try:
+        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        db.compile(
+            expressions=[rb"(?:^|\W)" + re.escape(w).encode("utf-8") + rb"(?:\W|$)" for w in words],
+            ids=list(range(len(words))),
+            flags=[flags] * len(words),
+        )
+    except hyperscan.error:
+        # e.g. a CPU without the instruction set Hyperscan needs; use the next backend
+        return None, None
+    return db, [positions[w] for w in words]
+
+# backend preference: hyperscan, then Aho-Corasick, then the per-phase regexes
+hs_db, hs_entries = build_hyperscan_db()
 
-discover_pat = compile_patterns(discover_kw)
-define_pat = compile_patterns(define_kw)
-develop_pat = compile_patterns(develop_kw)
-deliver_pat = compile_patterns(deliver_kw)
+def _on_hs_match(kw_id, start, end, flags, matched):
+    matched.add(kw_id)
 
-def score_phase(full_text, designer_text, planner_text, citizen_text):
-    t = full_text or ""
-    scores = {"Discover": 0.0, "Define": 0.0, "Develop": 0.0, "Deliver": 0.0}
+# denominators for the normalized hit counts, in PHASES order
+PHASE_SIZES = [max(1, len(words)) for words in PHASE_KEYWORDS]
 
-    # count normalized hits (matches / set size)
-    def norm_count(patterns):
-        cnt = 0
-        for p in patterns:
-            if p.search(t):
-                cnt += 1
-        return cnt / max(1, len(patterns))
+def phase_hits(segments):
+    """Distinct keywords of each phase that occur as whole words in any of the segments.
 
-    scores['Discover'] += norm_count(discover_pat)
-    scores['Define'] += norm_count(define_pat)
-    scores['Develop'] += norm_count(develop_pat)
-    scores['Deliver'] += norm_count(deliver_pat)
+    segments must already be passed through fold_text.
+    """
+    hits = [set(), set(), set(), set()]
+    for t in segments:
+        if not t:
+            continue
+        if hs_db is not None:
+            try:
+                data = t.encode("utf-8")
+            except UnicodeEncodeError:
+                # lone surrogates are not valid UTF-8 input; use the next backend
+                data = None
+            if data is not None:
+                matched = set()
+                hs_db.scan(data, match_event_handler=_on_hs_match, context=matched)
+                for kw_id in matched:
+                    for pid, kid in hs_entries[kw_id]:
+                        hits[pid].add(kid)
+                continue
+
+        if automaton is None:
+            for pid, pattern in enumerate(phase_patterns):
+                # groups are 1-based; store the keyword index like the other backends
+                hits[pid].update(m.lastindex - 1 for m in pattern.finditer(t))
+            continue
+
+        n = len(t)
+        for end, (length, entries) in automaton.iter(t):
+            start = end - length + 1
+            # keep whole-word matches only, like \b...\b (\w is alnum or '_');
+            # tested inline since this runs for every raw match
+            if start > 0:
+                c = t[start - 1]
+                if c.isalnum() or c == "_":
+                    continue
+            if end + 1 < n:
+                c = t[end + 1]
+                if c.isalnum() or c == "_":
+                    continue
+            for pid, kid in entries:
+                hits[pid].add(kid)
+    return hits
+
+def phase_scores(segments, designer_text, planner_text, citizen_text):
+    """Scores in PHASES order: Discover, Define, Develop, Deliver.
+
+    segments are the record's texts (keyword, citizen, designer, planner, source),
+    scanned one by one instead of joined into a single string; they and citizen_text
+    must already be passed through fold_text.
+    """
+    # count normalized hits (distinct keywords matched / set size), indexed like PHASES
+    hits = phase_hits(segments)
+    scores = [len(hits[0]) / PHASE_SIZES[0], len(hits[1]) / PHASE_SIZES[1],
+              len(hits[2]) / PHASE_SIZES[2], len(hits[3]) / PHASE_SIZES[3]]
 
     # boost if citizen text contains discovery signals
-    if any(p.search(citizen_text or "") for p in discover_pat):
-        scores['Discover'] += 0.5
+    if phase_hits((citizen_text,))[0]:
+        scores[0] += 0.5
     # designer text is a strong signal for Develop
     if designer_text and len(designer_text.strip())>0:
-        scores['Develop'] += 0.4
+        scores[2] += 0.4
     # planner text signals Deliver
     if planner_text and len(planner_text.strip())>0:
-        scores['Deliver'] += 0.4
+        scores[3] += 0.4
 
+    return scores
+
+def pick_phase(scores):
     # pick best; tie-breaker order Discover, Define, Develop, Deliver
-    best = max(scores.values())
+    best = max(scores)
     if best == 0:
         return 'Discover'
-    for p in ['Discover','Define','Develop','Deliver']:
-        if scores[p] == best:
-            return p
+    return PHASES[scores.index(best)]
+
+def score_phase(segments, designer_text, planner_text, citizen_text):
+    folded = tuple(fold_text(seg) for seg in segments)
+    return pick_phase(phase_scores(folded, designer_text, planner_text, fold_text(citizen_text)))
+
+def assign_phases(score_rows):
+    """Phase for every row of phase_scores, picked in one argmax when numpy is available"""
+    if np is None or not score_rows:
+        return [pick_phase(row) for row in score_rows]
+    scores = np.array(score_rows)
+    # argmax returns the first maximum, so ties keep the Discover..Deliver priority
+    idx = scores.argmax(axis=1)
+    idx[scores.max(axis=1) == 0] = 0
+    return [PHASES[i] for i in idx.tolist()]
 
+@functools.lru_cache(maxsize=SCORE_CACHE_SIZE)
+def cached_scores(segments, designer_text, planner_text, citizen_text):
+    """phase_scores as a tuple, remembered so duplicate records are scored once"""
+    return tuple(phase_scores(segments, designer_text, planner_text, citizen_text))
+
+def _record_scores(args):
+    return cached_scores(*args)
+
+def score_records(records):
+    """Scores for every (segments, designer, planner, citizen) tuple, in order.
+
+    Large inputs are spread over one worker process per core; workers build their
+    keyword matcher at import, so only the text tuples and score rows are pickled.
+    """
+    processes = os.cpu_count() or 1
+    if len(records) < POOL_MIN_RECORDS or processes < 2:
+        return [cached_scores(*args) for args in records]
+    with Pool(processes=processes) as pool:
+        return list(pool.imap(_record_scores, records, chunksize=POOL_CHUNKSIZE))
 
 def main():
     if not IN.exists():
         print(f"{IN} not found")
         return
-    data = json.loads(IN.read_text(encoding="utf-8"))
+    if orjson is not None:
+        data = orjson.loads(IN.read_bytes())
+    else:
+        data = json.loads(IN.read_text(encoding="utf-8"))
     out = []
+    records = []
     for item in data:
-        text_parts = []
         keyword = item.get("keyword","")
-        text_parts.append(keyword)
-        citizen = item.get("roles",{}).get("citizen",{}).get("exact_sentence","") or item.get("roles",{}).get("citizen",{}).get("original_sentence","")
-        text_parts.append(citizen)
-        designer = item.get("roles",{}).get("designer",{}).get("design_suggestion","") or ""
-        planner = item.get("roles",{}).get("planner",{}).get("planning_suggestion","") or ""
-        text_parts.extend([designer, planner, item.get("source","")])
-
-        full = " ".join([str(p) for p in text_parts if p])
+        # bind each role's dict once instead of walking item["roles"] per field
+        roles = item.get("roles") or {}
+        c = roles.get("citizen") or {}
+        d = roles.get("designer") or {}
+        p = roles.get("planner") or {}
+        citizen = c.get("exact_sentence") or c.get("original_sentence") or ""
+        designer = d.get("design_suggestion") or ""
+        planner = p.get("planning_suggestion") or ""
+
+        # scanned segment by segment; no joined copy of the record's text.
+        # Lowercased once here, and the citizen boost reuses the folded citizen text
+        segments = tuple(fold_text(seg) for seg in (keyword, citizen, designer, planner, item.get("source","")))
         # pass individual texts so scorer can weight designer/planner/citizen separately
         designer_text = designer
         planner_text = planner
-        citizen_text = citizen
-        phase = score_phase(full, designer_text, planner_text, citizen_text)
-        item["phase"] = phase
-        if "day" in item:
-            del item["day"]
+        citizen_text = segments[1]
+        records.append((segments, designer_text, planner_text, citizen_text))
+        item.pop("day", None)
         out.append(item)
-    OUT.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding='utf-8')
+    for item, phase in zip(out, assign_phases(score_records(records))):
+        item["phase"] = phase
+    if orjson is not None:
+        OUT.write_bytes(orjson.dumps(out, option=orjson.OPT_INDENT_2))
+    else:
+        OUT.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding='utf-8')
     print(f"Wrote {len(out)} entries to {OUT}")
 
 if __name__ == "__main__":